@@ -1,23 +1,20 @@
 # config.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 import os
 from dotenv import load_dotenv
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ProductListing:
-    """Represents a product listing from the marketplace."""
+    """Represents a product listing from the marketplace.
+    
+    Listings are immutable and hashable; equality and hashing cover name,
+    price and url only, so a re-hosted image does not make a listing new.
+    """
     name: str
     price: float
     url: str
-    image_url: str
-    
-    def __eq__(self, other):
-        if not isinstance(other, ProductListing):
-            return False
-        return (self.name == other.name and 
-                self.price == other.price and 
-                self.url == other.url)
+    image_url: str = field(compare=False)
 
 class Config:
     """Configuration management for the application."""
@@ -25,7 +22,19 @@ class Config:
         load_dotenv()
         self.DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
         self.DISCORD_CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID'))
+        self.OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
         self.WEBSITE_URL = "https://kfamarketplace.com/product/listing/?stock=in"
         self.BASE_URL = "https://kfamarketplace.com"
         self.MONITORING_INTERVAL = 43200  # 12 hours in seconds
-        self.DATA_FILE = "previous_listings.json"
+        self.DATA_FILE = "previous_listings.json.zst"  # zstd-compressed JSON snapshot
+        self.LEGACY_DATA_FILE = "previous_listings.json"  # Read once if no snapshot exists yet
+        self.LISTINGS_LOG_FILE = "listings.jsonl"  # JSON Patches applied on top of DATA_FILE
+        self.SNAPSHOT_INTERVAL = 10  # Patches logged before DATA_FILE is rewritten
+        self.CACHE_FILE = "scrape_cache.json"  # Per-URL HTTP validators for conditional GETs
+        self.LISTINGS_CACHE_DIR = ".cache/listings"  # OpenAI extractions keyed by HTML hash
+        self.LISTINGS_CACHE_MAX_ENTRIES = 32  # Oldest extractions are pruned beyond this
+        self.PROFILES_FILE = ".cache/profiles.json"  # Winning card selector per site
+        # Only ask OpenAI for listings when the product card selectors fall short
+        # and an API key is set; selectors are the main path and don't need one
+        self.LLM_FALLBACK = os.getenv('LLM_FALLBACK', 'true').lower() == 'true' and bool(self.OPENAI_API_KEY)
+        self.SCRAPER_MODEL = os.getenv('SCRAPER_MODEL', 'gpt-4o-mini')  # First-choice extraction model
@@ -17,6 +17,9 @@ class DiscordNotifier:
         
         self.client = discord.Client(intents=intents)
         self._ready = asyncio.Event()
+        # Caps sends in flight at once, shared across calls; it doesn't pace them.
+        # discord.py waits out Discord's per-channel rate limit buckets itself
+        self._send_semaphore = asyncio.Semaphore(5)
         
         @self.client.event
         async def on_ready():
@@ -51,29 +54,40 @@ class DiscordNotifier:
         """Wait until the Discord client is ready."""
         await self._ready.wait()
     
+    def _build_embed(self, listing: ProductListing) -> discord.Embed:
+        """Build the Discord embed for a single listing."""
+        embed = discord.Embed(
+           title=listing.name,
+           url=listing.url,
+           color=discord.Color.orange()
+        )
+        embed.add_field(name="Price", value=f"${listing.price:.2f}")
+        embed.set_image(url=listing.image_url)
+        return embed
+    
     async def send_notifications(self, listings: List[ProductListing]):
         """
         Send notifications to Discord for new listings.
         
+        Messages are sent concurrently, at most five in flight at once;
+        discord.py paces them to the channel rate limit. A failed message is
+        logged without stopping the others.
+        
         Args:
             listings: List of new ProductListing objects to notify about
         """
-        try:
-            channel = self.client.get_channel(self.config.DISCORD_CHANNEL_ID)
-            if not channel:
-                raise ValueError(f"Could not find channel with ID {self.config.DISCORD_CHANNEL_ID}")
-            
-            for listing in listings:
-                embed = discord.Embed(
-                   title=listing.name,
-                   url=listing.url,
-                   color=discord.Color.orange()
-                )
-                embed.add_field(name="Price", value=f"${listing.price:.2f}")
-                embed.set_image(url=listing.image_url)
-                
+        channel = self.client.get_channel(self.config.DISCORD_CHANNEL_ID)
+        if not channel:
+            logging.error(f"Failed to send Discord notification: could not find channel with ID {self.config.DISCORD_CHANNEL_ID}")
+            raise ValueError(f"Could not find channel with ID {self.config.DISCORD_CHANNEL_ID}")
+        
+        embeds = [self._build_embed(listing) for listing in listings]
+        
+        async def _send(embed: discord.Embed):
+            async with self._send_semaphore:
                 await channel.send(embed=embed)
-                
-        except Exception as e:
-            logging.error(f"Failed to send Discord notification: {e}")
-            raise
+        
+        results = await asyncio.gather(*(_send(embed) for embed in embeds), return_exceptions=True)
+        for listing, result in zip(listings, results):
+            if isinstance(result, Exception):
+                logging.error(f"Failed to send Discord notification for {listing.url}: {result}")
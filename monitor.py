@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from config import Config
+from scraper import WebScraper
+from discord_notifier import DiscordNotifier
+
+class Monitor:
+    """Main application class that coordinates monitoring and notifications."""
+    
+    def __init__(self):
+        """Initialize the monitor; logging is configured by the entry point."""
+        self.config = Config()
+        self.scraper = WebScraper(self.config)
+        self.notifier = DiscordNotifier(self.config)
+        
+    async def check_for_updates(self):
+        """Checks for new listings and sends notifications if found."""
+        try:
+            # Scraping runs in worker threads so the Discord gateway heartbeat
+            # isn't starved while it waits on the network
+            new_listings = await self.scraper.get_new_listings_async()
+            logging.debug(f"Found listings: {new_listings}")
+            if new_listings:
+                await self.notifier.send_notifications(new_listings)
+                logging.info(f"Sent notifications for {len(new_listings)} new listings")
+            else:
+                logging.info("No new listings found")
+        except Exception as e:
+            logging.error(f"Error during update check: {e}")
+
+    async def run(self):
+        """Runs the monitoring loop."""
+        try:
+            # Start the Discord client
+            logging.info("Connecting to Discord...")
+            logging.debug(f"Discord client intents: {self.notifier.client.intents}")
+            client_task = asyncio.create_task(self.notifier.start())
+            
+            # Wait for the client to be ready
+            await self.notifier.wait_until_ready()
+            logging.info("Discord client is ready!")
+            logging.debug(f"Connected with client ID: {self.notifier.client.user.id}")
+            logging.debug(f"Connected to {len(self.notifier.client.guilds)} guilds")
+            
+            # Verify channel access before entering the loop
+            channel = self.notifier.client.get_channel(self.config.DISCORD_CHANNEL_ID)
+            if channel is None:
+                raise ConnectionError(f"Could not access channel {self.config.DISCORD_CHANNEL_ID}. Please verify channel ID and bot permissions.")
+            logging.info(f"Successfully verified access to channel: {channel.name}")
+            
+            # Run monitoring loop against absolute deadlines so the time spent
+            # checking doesn't push every later check back
+            deadline = time.monotonic()
+            while True:
+                await self.check_for_updates()
+                deadline += self.config.MONITORING_INTERVAL
+                await asyncio.sleep(max(0, deadline - time.monotonic()))
+                
+        except asyncio.CancelledError:
+            logging.info("Shutting down...")
+            await self.notifier.close()
+            await client_task
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+            logging.debug(f"Client ready state: {self.notifier.client.is_ready()}")
+            logging.debug(f"Client latency: {self.notifier.client.latency}")
+            await self.notifier.close()
+            await client_task
+            raise
+        finally:
+            self.scraper.close()
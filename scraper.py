@@ -1,247 +1,867 @@
+import asyncio
+import functools
+import hashlib
 import os
-from typing import List
+import re
+import tempfile
+from dataclasses import asdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from typing import FrozenSet, List, Optional, Sequence, Tuple, Union
 import json
-import requests
+import jsonpatch
+import zstandard as zstd
+import httpx
 import logging
-from bs4 import BeautifulSoup
-from openai import OpenAI
-from dotenv import load_dotenv
+import lxml.etree
+import lxml.html
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import (
+    Retrying, retry, retry_if_exception, retry_if_exception_type,
+    stop_after_attempt, wait_exponential, wait_exponential_jitter
+)
 from config import ProductListing
 from config import Config
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder works, just slower
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+# First dollar amount in a price block, e.g. "$1,234.50" -> "1,234.50"
+_PRICE_PATTERN = re.compile(r'\$\s*([\d,]+(?:\.\d+)?)')
+# Runs of whitespace left by indentation and stripped elements
+_WHITESPACE_RUN = re.compile(r'\s+')
+_WHITESPACE_RUN_BYTES = re.compile(rb'\s+')
+
+
+# Extraction prompt for the OpenAI fallback. Both are static and sent ahead of
+# the page HTML, so every request shares the same prefix for OpenAI's prompt cache
+_SYSTEM_PROMPT = "You are a world-class HTML parsing expert. Your extraction must be complete and accurate. DO NOT STOP until you find at least 25 listings."
+_EXTRACTION_PROMPT = """You are a specialized web scraping expert with deep knowledge of HTML parsing. Your ONLY task is to extract ALL product listings from the provided HTML content. You MUST follow these instructions with absolute precision:
+
+CRITICAL REQUIREMENTS FOR URLS:
+- ALL URLs must be absolute (starting with http:// or https://)
+- If a URL is relative (starts with /), prepend with 'https://kfamarketplace.com'
+- Product URLs should point to the full product page
+- Image URLs must be complete, valid image URLs
+
+STEP 1: THOROUGH HTML ANALYSIS
+- CRITICAL: First output the COMPLETE HTML content length to verify you have the full page
+- Search exhaustively for ALL possible product containers using these selector patterns IN ORDER:
+1. First try: div[class*='product'], div[class*='item'], div[class*='listing'], div[class*='card']
+2. If not enough results: li elements within ul[class*='product'], ul[class*='grid'], ul[class*='list']
+3. If still not enough: article elements, table tr[class*='product']
+4. Last resort: ANY div containing both price patterns ($) and product-like content
+- YOU MUST KEEP SEARCHING UNTIL YOU FIND AT LEAST 25-30 PRODUCTS
+- DO NOT STOP until you've found enough products
+- If initial selectors fail, RECURSIVELY SEARCH all div elements for price patterns
+
+STEP 2: AGGRESSIVE DATA EXTRACTION
+- For EACH container found, extract ALL of these (NO EXCEPTIONS):
+* Product Name: h1-h6, strong, span[class*='title'], div[class*='title']
+* Price: *[text()*='$'], *[class*='price']
+* Product URL: closest ancestor <a> or child <a>
+* Image URL: img[src], img[data-src], div[style*='background']
+- If ANY item is missing data, search parent and child elements
+- DO NOT SKIP ANY CONTAINER - Find the data no matter what
+
+STEP 3: RUTHLESS VALIDATION
+- Enforce these rules but DO NOT DISCARD LISTINGS:
+* Name: Must be non-empty string
+* Price: Must contain '$' (add if missing)
+* URLs: Must be absolute (fix if relative)
+* Image URLs: Must be valid image URL (fix if needed)
+- Flag validation issues but KEEP ALL LISTINGS
+
+STEP 4: MANDATORY QUALITY CHECKS
+- YOU MUST HAVE 25+ LISTINGS OR YOU HAVE FAILED
+- If you have fewer than 25 listings:
+1. Try alternative selectors
+2. Search deeper in the DOM
+3. Look for hidden elements
+4. Check for lazy-loaded content
+- DO NOT RETURN UNTIL YOU HAVE ENOUGH LISTINGS
+
+FINAL WARNINGS:
+- YOU MUST FIND AT LEAST 25 LISTINGS OR YOU HAVE FAILED
+- KEEP SEARCHING UNTIL YOU FIND THEM ALL
+- DO NOT MAKE UP OR HALLUCINATE DATA
+- If you fail to find enough listings, explain EXACTLY why and which selectors you tried
+
+Report every listing through the emit_listings function."""
+
+
+def _parse_price(value) -> Optional[float]:
+    """
+    Parses the first dollar amount in a price such as "$1,234.50" or "$10 - $20".
+    
+    Returns None when there is no dollar amount, e.g. "Sold out".
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    price_match = _PRICE_PATTERN.search(str(value))
+    if not price_match:
+        return None
+    return float(price_match.group(1).replace(',', ''))
+
+
+def _first(item: dict, *keys: str):
+    """Returns the first truthy value among keys, or an empty string."""
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return ''
+
+
+def _content_hash(html_content: Union[str, bytes]) -> str:
+    """Fingerprints HTML for change detection; blake2b is fast and ample for this."""
+    if isinstance(html_content, str):
+        html_content = html_content.encode()
+    return hashlib.blake2b(html_content, digest_size=16).hexdigest()
+
+
+@functools.lru_cache(maxsize=32)
+def _read_cached_listings(cache_path: str) -> Tuple[ProductListing, ...]:
+    """
+    Reads a content-addressed extraction result.
+    
+    Entries are never rewritten once created, so hits can be memoized; callers
+    must check the file exists first so misses aren't cached.
+    """
+    with open(cache_path, 'rb') as f:
+        return tuple(ProductListing(**item) for item in _json_loads(f.read()))
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_xpath(expression: str) -> lxml.etree.XPath:
+    """Compiles an XPath expression once; the compiled object is reused for every card."""
+    return lxml.etree.XPath(expression)
+
+
+def _product_path(url: str) -> str:
+    """Normalizes a listing URL to everything after its last /product/, without a trailing slash."""
+    return url.rpartition('/product/')[2].rstrip('/')
+
+
+def _write_atomic(path: str, data: bytes):
+    """Writes data to a uniquely named temp file beside path, then swaps it into place."""
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.', delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
+
+
+def _json_dumps(obj) -> bytes:
+    """Serializes obj to JSON bytes, using orjson when it is available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def _json_loads(data: bytes):
+    """Parses JSON bytes or str, using orjson when it is available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Responses worth retrying: throttling and transient server errors
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _is_retryable_status(exc: BaseException) -> bool:
+    """Whether a failed fetch should be retried."""
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in _RETRY_STATUSES
+
+
+class NotModified(Exception):
+    """Raised when the server reports the page is unchanged since the last scrape."""
 
-logging.basicConfig(level=logging.INFO)
 
 class WebScraper:
     """Handles website scraping and product listing extraction."""
     
+    # Bytes read from the response per incremental parser feed
+    STREAM_CHUNK_SIZE = 65536
+    # URL schemes accepted for listing and image links
+    _SCHEMES = ('http://', 'https://')
+    # Candidate wrappers around the product grid, most specific first; everything
+    # outside the first one found is ignored. Within a candidate the first match
+    # in document order wins, so class names are matched as whole tokens and a
+    # candidate must hold a priced link with an image; a header or nav that only
+    # shares a class name can't become the region.
+    PRODUCT_REGION_XPATHS = (
+        "//ul[contains(concat(' ', normalize-space(@class), ' '), ' products ')]"
+        "[.//a[@href]][.//img][.//text()[contains(., '$')]]",
+        "//*[contains(concat(' ', normalize-space(@class), ' '), ' products ')]"
+        "[.//a[@href]][.//img][.//text()[contains(., '$')]]",
+        "//main[.//a[@href]][.//img][.//text()[contains(., '$')]]",
+        "//*[@id='content'][.//a[@href]][.//img][.//text()[contains(., '$')]]",
+    )
+    # Elements that never carry listing data
+    NOISE_TAGS = ('script', 'style', 'noscript', 'svg', 'iframe', 'link', 'meta', lxml.etree.Comment)
+    # Product card containers, most specific first. They are relative to the
+    # element handed to extraction, so cards outside the product region (related
+    # products, footers) are never read. The broad patterns only accept elements
+    # holding exactly one price, so grid wrappers don't match; the last one is
+    # any div with a link, an image and a single dollar amount.
+    CARD_XPATHS = (
+        ".//li[contains(concat(' ', normalize-space(@class), ' '), ' product ')]",
+        ".//div[contains(@class, 'product-item')]",
+        ".//div[contains(@class, 'product-card')]",
+        ".//div[contains(@class, 'product')][count(.//*[contains(@class, 'price')]) = 1]",
+        ".//div[contains(@class, 'item') or contains(@class, 'listing') or contains(@class, 'card')]"
+        "[count(.//*[contains(@class, 'price')]) = 1]",
+        "descendant-or-self::ul[contains(@class, 'product') or contains(@class, 'grid') or contains(@class, 'list')]/li",
+        ".//article",
+        ".//tr[contains(@class, 'product')]",
+        ".//div[.//a[@href]][.//img][count(.//text()[contains(., '$')]) = 1]",
+    )
+    NAME_XPATH = (".//*[contains(@class, 'title') or contains(@class, 'name')]"
+                  " | .//h1 | .//h2 | .//h3 | .//h4 | .//h5 | .//h6 | .//strong")
+    PRICE_XPATH = ".//*[contains(@class, 'price')]"
+    # Cards without a price element still count if some text carries a price
+    PRICE_TEXT_XPATH = ".//text()[contains(., '$')]"
+    
+    # Listings a selector must yield to win outright, and the OpenAI fallback's
+    # attempt budget for transient API errors (read when the class is defined)
+    MIN_REQUIRED_LISTINGS = 20
+    LLM_MAX_ATTEMPTS = 5
+    # Model asked once more when the configured model comes back short, and the
+    # completion budget per extraction so a model can't run on indefinitely
+    ESCALATION_MODEL = "gpt-4-turbo-preview"
+    LLM_MAX_TOKENS = 4000
+    # Function schema the OpenAI fallback must answer with
+    EXTRACTION_TOOL = {
+        "type": "function",
+        "function": {
+            "name": "emit_listings",
+            "description": "Report every product listing found in the HTML.",
+            "strict": True,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "listings": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string"},
+                                "price": {"type": "string"},
+                                "url": {"type": "string"},
+                                "image_url": {"type": "string"}
+                            },
+                            "required": ["name", "price", "url", "image_url"],
+                            "additionalProperties": False
+                        }
+                    }
+                },
+                "required": ["listings"],
+                "additionalProperties": False
+            }
+        }
+    }
+    
     def __init__(self, config: Config):
         self.config = config
         self.base_url = self.config.BASE_URL  # Add base URL
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        # HTTP/2 lets later per-product fetches multiplex over one pooled connection;
+        # the transport retries failed connects, status retries happen in scrape_site
+        self.client = httpx.Client(
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                'Accept-Encoding': 'gzip, br'
+            },
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            transport=httpx.HTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60)
+            )
+        )
+        # ETag / Last-Modified and content hash of the last fully processed page, per URL
+        self.validators = self.load_validators()
+        # Card selector that last won for each site, tried before the full search
+        self.site_profiles = self.load_site_profiles()
+        self._pending_validators = {}
+        # Shared across scrapes so the connection to the API stays pooled
+        self.openai = OpenAI(api_key=self.config.OPENAI_API_KEY) if self.config.LLM_FALLBACK else None
         
+    def close(self):
+        """Release the pooled HTTP connections."""
+        self.client.close()
+
     def format_url(self, url: str) -> str:
         """Ensure URL is absolute by adding base URL if necessary."""
-        if url.startswith('/'):
-            return f"{self.base_url}{url}"
-        elif url.startswith('http'):
+        if url.startswith(self._SCHEMES):
             return url
+        elif url.startswith('//'):
+            # Protocol-relative links (common for CDN-hosted images) keep their host
+            return f"https:{url}"
+        elif url.startswith('/'):
+            return f"{self.base_url}{url}"
         else:
             return f"{self.base_url}/{url}"
 
-    def scrape_site(self, target_url: str) -> BeautifulSoup:
+    def _http_url(self, raw_url) -> Optional[str]:
+        """Makes a link absolute, or returns None if it is empty or has a scheme other than http(s)."""
+        raw_url = str(raw_url).strip()
+        if not raw_url or urlsplit(raw_url).scheme not in ('', 'http', 'https'):
+            return None
+        return self.format_url(raw_url)
+
+    def scrape_site(self, target_url: str, region_xpaths: Sequence[str] = ()):
         """
-        Scrapes the website and returns current product listings.
+        Scrapes the website and returns its parsed HTML.
+        
+        The tree is handed on as-is so extraction doesn't re-parse it; use
+        serialize_html when the markup itself is needed.
+        
+        Args:
+            target_url: Page to fetch
+            region_xpaths: Optional XPaths of the element holding the listings,
+                tried in order. When given, scripts, styles and other noise are
+                stripped and only the first matching subtree is returned, which
+                keeps the rest of the page out of extraction and out of the
+                OpenAI prompt.
         
         Returns:
-            BeautifulSoup: BeautifulSoup object containing the scraped data of the website
+            lxml.html.HtmlElement: Root of the page, or the matched region
         
         Raises:
-            requests.RequestException: If website cannot be accessed
-            ValueError: If parsing fails
+            NotModified: If the server answers 304 to the conditional request
+            httpx.HTTPError: If website cannot be accessed
         """
-        session = requests.Session()
+        cached = self.validators.get(target_url, {})
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        
+        retrying = Retrying(
+            stop=stop_after_attempt(4),
+            wait=wait_exponential(multiplier=0.5),
+            retry=retry_if_exception(_is_retryable_status),
+            reraise=True
+        )
         try:
-            response = session.get(target_url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'lxml')
-    
-            return soup
-            
-        except requests.RequestException as e:
-            logging.error(f"Failed to fetch website: {e}")
+            for attempt in retrying:
+                with attempt:
+                    with self.client.stream('GET', target_url, headers=headers) as response:
+                        if response.status_code == 304:
+                            raise NotModified(target_url)
+                        response.raise_for_status()
+                        tree = self._parse_stream(response)
+        except httpx.HTTPError as e:
+            logger.error("Failed to fetch website: %s", e)
             raise
-        except (AttributeError, ValueError) as e:
-            logging.error(f"Failed to parse website content: {e}")
-            raise ValueError("Failed to parse website content")
+        
+        # Only committed once the listings from this response have been saved
+        self._pending_validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
+        
+        if not region_xpaths:
+            return tree
+        return self._trim_html(tree, region_xpaths)
 
-    def get_current_listings(self, beautifulsoup_object: BeautifulSoup) -> List[ProductListing]:
+    def _parse_stream(self, response: httpx.Response):
+        """
+        Parses a streamed response body incrementally.
+        
+        The body is fed to lxml in STREAM_CHUNK_SIZE pieces, so peak memory is one
+        chunk plus the tree rather than the full body as bytes and again as str.
+        """
+        parser = lxml.html.HTMLParser(encoding=response.charset_encoding)
+        for chunk in response.iter_bytes(self.STREAM_CHUNK_SIZE):
+            parser.feed(chunk)
+        return parser.close()
+
+    def _trim_html(self, tree, region_xpaths: Sequence[str]):
+        """Strips noise elements, comments and inline styles, then returns the first matching region."""
+        lxml.etree.strip_elements(tree, *self.NOISE_TAGS, with_tail=False)
+        for element in tree.xpath('//*[@style]'):
+            del element.attrib['style']
+        
+        for region_xpath in region_xpaths:
+            regions = tree.xpath(region_xpath)
+            if regions:
+                region = regions[0]
+                break
+        else:
+            logger.warning("Product region not found, using the full page")
+            region = tree
+        return region
+
+    @staticmethod
+    def serialize_html(element) -> bytes:
+        """Serializes a parsed subtree to UTF-8 bytes with whitespace runs collapsed."""
+        return _WHITESPACE_RUN_BYTES.sub(b' ', lxml.html.tostring(element, encoding='utf-8'))
+
+    def get_current_listings(self, html_content, site: Optional[str] = None) -> List[ProductListing]:
+        """
+        Extracts product listings from the marketplace HTML.
+        
+        Listings are read directly from the product cards with XPath selectors,
+        searched only within html_content, so a region from scrape_site limits
+        them to the product grid.
+        OpenAI is only asked as a fallback when no selector finds
+        MIN_REQUIRED_LISTINGS cards, and only if LLM_FALLBACK is enabled; only
+        then is the tree serialized and decoded to text. The fallback asks
+        SCRAPER_MODEL and, if that answer falls short, ESCALATION_MODEL, so up
+        to two calls, each retried on transient errors (see _extract_with_llm).
+        
+        Args:
+            html_content: A parsed lxml element as returned by scrape_site, or
+                the page's HTML as str or bytes
+            site: Optional domain the page came from; its stored card selector
+                is tried first and the winning selector is remembered for it
+        
+        Returns:
+            List[ProductListing]: List of current product listings
+            
+        Raises:
+            ValueError: If the selectors fall short and the fallback is disabled
+        """
+        if isinstance(html_content, (str, bytes)):
+            html_content = lxml.html.fromstring(html_content)
+        
+        listings = self._extract_with_selectors(html_content, site)
+        if listings:
+            logger.debug("Extracted %s listings with selectors", len(listings))
+            return listings
+        
+        if not self.config.LLM_FALLBACK:
+            raise ValueError(f"No card selector found {self.MIN_REQUIRED_LISTINGS} listings and the LLM fallback is disabled")
+        
+        logger.warning("No card selector found %s listings, falling back to OpenAI extraction", self.MIN_REQUIRED_LISTINGS)
+        return self._extract_with_llm(self.serialize_html(html_content).decode('utf-8'))
+
+    def _extract_with_selectors(self, tree, site: Optional[str] = None) -> List[ProductListing]:
+        """
+        Reads listings from a parsed tree with the prioritized card selectors.
+        
+        A site's stored card selector is used on its own while it still yields
+        MIN_REQUIRED_LISTINGS. Otherwise all selectors are searched and the
+        first one to reach MIN_REQUIRED_LISTINGS wins and is stored for the
+        site. A smaller result is treated as a miss and nothing is returned, so
+        a stray match can't stand in for the catalog.
+        """
+        profiled_xpath = self.site_profiles.get(site, {}).get('card_xpath') if site else None
+        # A profile stored by an older selector set is rediscovered rather than trusted
+        if profiled_xpath in self.CARD_XPATHS:
+            listings = self._extract_cards(tree, profiled_xpath)
+            if len(listings) >= self.MIN_REQUIRED_LISTINGS:
+                return listings
+            logger.info("Stored card selector for %s found %s listings, searching all selectors", site, len(listings))
+        
+        for card_xpath in self.CARD_XPATHS:
+            listings = self._extract_cards(tree, card_xpath)
+            if len(listings) >= self.MIN_REQUIRED_LISTINGS:
+                if site and card_xpath != profiled_xpath:
+                    self.save_site_profile(site, {'card_xpath': card_xpath})
+                return listings
+        return []
+
+    def _extract_cards(self, tree, card_xpath: str) -> List[ProductListing]:
+        """Parses every card matched by card_xpath into listings, de-duplicated by URL."""
+        # Nested containers can match the same product twice; keep the first
+        listings = []
+        seen = set()
+        for card in _compiled_xpath(card_xpath)(tree):
+            listing = self._parse_card(card)
+            if listing is not None and listing.url not in seen:
+                seen.add(listing.url)
+                listings.append(listing)
+        return listings
+
+    def _parse_card(self, card) -> Optional[ProductListing]:
+        """Builds a listing from a product card, or None if a field is missing."""
+        names = _compiled_xpath(self.NAME_XPATH)(card)
+        prices = (
+            [price.text_content() for price in _compiled_xpath(self.PRICE_XPATH)(card)]
+            or _compiled_xpath(self.PRICE_TEXT_XPATH)(card)
+        )
+        hrefs = _compiled_xpath('.//a/@href')(card) or _compiled_xpath('ancestor::a[1]/@href')(card)
+        images = _compiled_xpath('.//img/@data-src')(card) or _compiled_xpath('.//img/@src')(card)
+        if not (names and prices and hrefs and images):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Skipping incomplete product card: %s", lxml.html.tostring(card)[:200])
+            return None
+        
+        price = _parse_price(prices[0])
+        url = self._http_url(hrefs[0])
+        image_url = self._http_url(images[0])
+        if price is None or url is None or image_url is None:
+            return None
+        
+        return ProductListing(
+            name=_WHITESPACE_RUN.sub(' ', names[0].text_content()).strip(),
+            price=price,
+            url=url,
+            image_url=image_url
+        )
+
+    def _extract_with_llm(self, html_content: str) -> List[ProductListing]:
         """
         Uses OpenAI API to get product listings from KFA Marketplace.
         
+        The extraction is requested from the configured SCRAPER_MODEL; see
+        _request_extraction for the handling of transient API errors. Only if
+        that answer is malformed or short of MIN_REQUIRED_LISTINGS is it asked
+        once more of ESCALATION_MODEL, keeping whichever result found more. A
+        result that is still short is never returned, so it can't be saved over
+        the previous listings.
+        
         Returns:
             List[ProductListing]: List of current product listings
             
         Raises:
+            ValueError: If fewer than MIN_REQUIRED_LISTINGS valid listings were found
             Exception: If API call fails or response parsing fails
         """
+        # Extraction is a pure function of the HTML, so identical pages reuse the stored
+        # result; only complete extractions are stored, so a hit never skips escalation
+        cache_path = os.path.join(self.config.LISTINGS_CACHE_DIR, f"{_content_hash(html_content)}.json")
+        if os.path.exists(cache_path):
+            cached = _read_cached_listings(cache_path)
+            if len(cached) >= self.MIN_REQUIRED_LISTINGS:
+                logger.info("Using cached extraction %s", cache_path)
+                return list(cached)
+        
+        model = self.config.SCRAPER_MODEL
         try:
-            # Initialize OpenAI client
-            # Load environment variables
-            load_dotenv()
-            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-            
-            # Construct the prompt and include the HTML content
-            html_content = str(beautifulsoup_object)
-            
-            # Initialize variables for retry loop
-            max_retries = 5
-            current_retry = 0
-            min_required_listings = 20
-            
-            while current_retry < max_retries:
-                prompt = f"""You are a specialized web scraping expert with deep knowledge of HTML parsing. Your ONLY task is to extract ALL product listings from the provided HTML content. You MUST follow these instructions with absolute precision:
-
-                CRITICAL REQUIREMENTS FOR URLS:
-                - ALL URLs must be absolute (starting with http:// or https://)
-                - If a URL is relative (starts with /), prepend with 'https://kfamarketplace.com'
-                - Product URLs should point to the full product page
-                - Image URLs must be complete, valid image URLs
-                
-                CRITICAL: This is attempt {current_retry + 1} of {max_retries}. Previous attempts failed to find enough listings. YOU MUST TRY HARDER.
-
-                STEP 1: THOROUGH HTML ANALYSIS
-                - CRITICAL: First output the COMPLETE HTML content length to verify you have the full page
-                - Search exhaustively for ALL possible product containers using these selector patterns IN ORDER:
-                1. First try: div[class*='product'], div[class*='item'], div[class*='listing'], div[class*='card']
-                2. If not enough results: li elements within ul[class*='product'], ul[class*='grid'], ul[class*='list']
-                3. If still not enough: article elements, table tr[class*='product']
-                4. Last resort: ANY div containing both price patterns ($) and product-like content
-                - YOU MUST KEEP SEARCHING UNTIL YOU FIND AT LEAST 25-30 PRODUCTS
-                - DO NOT STOP until you've found enough products
-                - If initial selectors fail, RECURSIVELY SEARCH all div elements for price patterns
-                
-                STEP 2: AGGRESSIVE DATA EXTRACTION
-                - For EACH container found, extract ALL of these (NO EXCEPTIONS):
-                * Product Name: h1-h6, strong, span[class*='title'], div[class*='title']
-                * Price: *[text()*='$'], *[class*='price']
-                * Product URL: closest ancestor <a> or child <a>
-                * Image URL: img[src], img[data-src], div[style*='background']
-                - If ANY item is missing data, search parent and child elements
-                - DO NOT SKIP ANY CONTAINER - Find the data no matter what
-                
-                STEP 3: RUTHLESS VALIDATION
-                - Enforce these rules but DO NOT DISCARD LISTINGS:
-                * Name: Must be non-empty string
-                * Price: Must contain '$' (add if missing)
-                * URLs: Must be absolute (fix if relative)
-                * Image URLs: Must be valid image URL (fix if needed)
-                - Flag validation issues but KEEP ALL LISTINGS
-                
-                STEP 4: MANDATORY QUALITY CHECKS
-                - YOU MUST HAVE 25+ LISTINGS OR YOU HAVE FAILED
-                - If you have fewer than 25 listings:
-                1. Try alternative selectors
-                2. Search deeper in the DOM
-                3. Look for hidden elements
-                4. Check for lazy-loaded content
-                - DO NOT RETURN UNTIL YOU HAVE ENOUGH LISTINGS
-                
-                FINAL WARNINGS:
-                - YOU MUST FIND AT LEAST 25 LISTINGS OR YOU HAVE FAILED
-                - KEEP SEARCHING UNTIL YOU FIND THEM ALL
-                - DO NOT MAKE UP OR HALLUCINATE DATA
-                - If you fail to find enough listings, explain EXACTLY why and which selectors you tried
-                
-                Return the standard JSON structure with listings array."""
-
-                # Make API call with both prompt and HTML content
-                response = client.chat.completions.create(
-                    model="gpt-4-turbo-preview",
-                    messages=[
-                        {"role": "system", "content": "You are a world-class HTML parsing expert. Your extraction must be complete and accurate. DO NOT STOP until you find at least 25 listings."},
-                        {"role": "user", "content": prompt},
-                        {"role": "user", "content": html_content}
-                    ],
-                    response_format={ "type": "json_object" }
-                )
-
-                logging.debug(f"OpenAI API Response (Attempt {current_retry + 1}): {response}")
-                
-                # Parse JSON response
-                json_response = json.loads(response.choices[0].message.content)
-                
-                # Check if we have listings directly in the response
-                listings_found = len(json_response.get('listings', []))
-                logging.debug(f"Attempt {current_retry + 1}: Found {listings_found} listings")
-                
-                if listings_found >= min_required_listings:
-                    # Clean and format the listings data
-                    listings = [
-                        ProductListing(
-                            name=item.get('name', '') or item.get('Product Name', ''),
-                            price=float(str(item.get('price', '') or item.get('Price', '')).replace('$', '').replace(',', '')),
-                            url=self.format_url(item.get('url', '') or item.get('Product URL', '')),  # Format URL
-                            image_url=self.format_url(item.get('image_url', '') or item.get('Image URL', ''))  # Format image URL
-                        )
-                        for item in json_response.get('listings', [])
-                    ]
-                    
-                    # Validate URLs before returning
-                    valid_listings = []
-                    for listing in listings:
-                        if not listing.url.startswith(('http://', 'https://')):
-                            logging.warning(f"Skipping listing with invalid URL: {listing.url}")
-                            continue
-                        if not listing.image_url.startswith(('http://', 'https://')):
-                            logging.warning(f"Skipping listing with invalid image URL: {listing.image_url}")
-                            continue
-                        valid_listings.append(listing)
-                    
-                    logging.debug(f"Successfully found {len(valid_listings)} valid listings")
-                    return valid_listings
-                    
-                current_retry += 1
-                
-                if current_retry == max_retries:
-                    raise Exception(f"Failed to find minimum required listings ({min_required_listings}) after {max_retries} attempts")
+            try:
+                json_response = self._request_extraction(html_content, model)
+            except ValueError as e:
+                if model == self.ESCALATION_MODEL:
+                    raise
+                logger.warning("%s returned malformed listings (%s), retrying with %s", model, e, self.ESCALATION_MODEL)
+                model = self.ESCALATION_MODEL
+                json_response = self._request_extraction(html_content, model)
             
+            listings_found = len(json_response.get('listings', []))
+            if listings_found < self.MIN_REQUIRED_LISTINGS and model != self.ESCALATION_MODEL:
+                logger.warning("%s only found %s listings, retrying with %s", model, listings_found, self.ESCALATION_MODEL)
+                escalated = self._request_extraction(html_content, self.ESCALATION_MODEL)
+                if len(escalated.get('listings', [])) > listings_found:
+                    json_response = escalated
+                    listings_found = len(escalated['listings'])
         except Exception as e:
             raise Exception(f"Failed to fetch listings from OpenAI API: {str(e)}")
+        
+        # Clean, format, validate and de-duplicate the listings data in one pass
+        listings = []
+        seen = set()
+        for listing in map(self._listing_from_item, json_response.get('listings', [])):
+            if listing is not None and listing.url not in seen:
+                seen.add(listing.url)
+                listings.append(listing)
+        if len(listings) < self.MIN_REQUIRED_LISTINGS:
+            raise ValueError(f"OpenAI only found {len(listings)} valid listings out of {listings_found}, "
+                             f"expected at least {self.MIN_REQUIRED_LISTINGS}")
+        logger.debug("Successfully found %s valid listings", len(listings))
+        
+        os.makedirs(self.config.LISTINGS_CACHE_DIR, exist_ok=True)
+        _write_atomic(cache_path, _json_dumps([asdict(listing) for listing in listings]))
+        self._prune_listings_cache()
+        return listings
+
+    def _prune_listings_cache(self):
+        """Deletes the oldest stored extractions beyond LISTINGS_CACHE_MAX_ENTRIES."""
+        with os.scandir(self.config.LISTINGS_CACHE_DIR) as entries:
+            files = [entry for entry in entries if entry.is_file() and entry.name.endswith('.json')]
+        files.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in files[self.config.LISTINGS_CACHE_MAX_ENTRIES:]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    @retry(
+        stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        retry=retry_if_exception_type((RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)),
+        reraise=True
+    )
+    def _request_extraction(self, html_content: str, model: str) -> dict:
+        """
+        Issues exactly one OpenAI extraction call and returns the parsed arguments.
+        
+        The model is forced to answer through the strict emit_listings tool at
+        temperature 0, so the result always has the listings array shape, and
+        is capped at LLM_MAX_TOKENS; an answer cut off at that cap is rejected
+        with ValueError rather than parsed. Only transient failures (rate
+        limits, connection errors and timeouts, 5xx) are retried, with jittered
+        exponential backoff; anything else, such as an authentication failure,
+        is raised immediately.
+        """
+        response = self.openai.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": _EXTRACTION_PROMPT},
+                {"role": "user", "content": html_content}
+            ],
+            tools=[self.EXTRACTION_TOOL],
+            tool_choice={"type": "function", "function": {"name": "emit_listings"}},
+            temperature=0,
+            max_tokens=self.LLM_MAX_TOKENS
+        )
+        # The full ChatCompletion repr is large; only build it when it will be emitted
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("OpenAI API Response: %s", response)
+        
+        choice = response.choices[0]
+        if choice.finish_reason == 'length':
+            raise ValueError(f"{model} response was cut off at {self.LLM_MAX_TOKENS} tokens")
+        return _json_loads(choice.message.tool_calls[0].function.arguments)
+
+    def _listing_from_item(self, item: dict) -> Optional[ProductListing]:
+        """Builds a listing from one OpenAI result item, or None if its URLs or price are invalid."""
+        url = self._http_url(_first(item, 'url', 'Product URL'))
+        if url is None:
+            logger.warning("Skipping listing with invalid URL: %s", item)
+            return None
+        image_url = self._http_url(_first(item, 'image_url', 'Image URL'))
+        if image_url is None:
+            logger.warning("Skipping listing with invalid image URL: %s", item)
+            return None
+        price = _parse_price(_first(item, 'price', 'Price'))
+        if price is None:
+            logger.warning("Skipping listing with invalid price: %s", item)
+            return None
+        
+        return ProductListing(
+            name=_first(item, 'name', 'Product Name'),
+            price=price,
+            url=url,
+            image_url=image_url
+        )
 
     def get_new_listings(self) -> List[ProductListing]:
         """
         Compares current listings with previous listings to find new ones.
         
+        Synchronous wrapper around get_new_listings_async for callers without an
+        event loop of their own.
+        
+        Returns:
+            List[ProductListing]: List of new product listings that weren't seen before
+        """
+        return asyncio.run(self.get_new_listings_async())
+
+    async def get_new_listings_async(self) -> List[ProductListing]:
+        """
+        Compares current listings with previous listings to find new ones.
+        
         The comparison is done by checking if each listing's URL exists in the previous listings.
         We compare the full URL paths (everything after /product/) to catch cases where the same
         product might have slightly different full URLs but the same path.
         
+        Loading the previous listings from disk doesn't depend on the fetch or
+        the extraction, so it runs in a worker thread alongside them instead of
+        after them. The loaded state is then reused for the diff and the save,
+        which run in a worker thread too, so the caller's loop stays responsive
+        throughout and the state is read once per poll.
+        
         Returns:
             List[ProductListing]: List of new product listings that weren't seen before
         """
-        scraped_content = self.scrape_site(target_url=self.config.WEBSITE_URL)
-        current_listings = self.get_current_listings(beautifulsoup_object=scraped_content)
-        previous_listings = self.load_previous_listings()
-        
-        # Create a set of previous URL paths for faster lookup
-        # Extract everything after /product/ to normalize URLs
-        def get_product_path(url: str) -> str:
-            try:
-                return url.split('/product/')[-1].rstrip('/')
-            except IndexError:
-                return url
+        target_url = self.config.WEBSITE_URL
+        current_listings, previous_state = await asyncio.gather(
+            asyncio.to_thread(self._fetch_current_listings, target_url),
+            asyncio.to_thread(self._load_listing_state)
+        )
+        if current_listings is None:
+            return []
+        return await asyncio.to_thread(self._record_listings, target_url, current_listings, previous_state)
+
+    def _record_listings(self, target_url: str, current_listings: List[ProductListing],
+                         previous_state: Tuple[List[dict], int, int]) -> List[ProductListing]:
+        """Diffs the current listings against previous_state, saves them and returns the new ones."""
+        previous_paths = frozenset(_product_path(item['url']) for item in previous_state[0])
+        new_listings = self.diff_listings(current_listings, previous_paths)
+        self.save_listings(current_listings, previous_state)
+        self.save_validators(target_url, self._pending_validators)
+        return new_listings
 
-        previous_paths = {get_product_path(listing.url) for listing in previous_listings}
+    def diff_listings(self, current_listings: List[ProductListing], previous_paths: FrozenSet[str]) -> List[ProductListing]:
+        """
+        Returns the current listings whose product path isn't among previous_paths.
         
-        # Only keep listings whose URL paths we haven't seen before
+        Args:
+            current_listings: Listings extracted from the page now
+            previous_paths: Product paths of the saved listings, from load_previous_paths
+        """
+        # The per-listing debug messages are only formatted when they will actually be emitted
+        debug = logger.isEnabledFor(logging.DEBUG)
         new_listings = []
         for listing in current_listings:
-            current_path = get_product_path(listing.url)
-            if current_path not in previous_paths:
+            if _product_path(listing.url) not in previous_paths:
                 new_listings.append(listing)
-                logging.debug(f"New listing found: {listing.url}")
-            else:
-                logging.debug(f"Skipping duplicate listing: {listing.url}")
-        
-        logging.debug(f"Found {len(new_listings)} new listings out of {len(current_listings)} current listings")
+                if debug:
+                    logger.debug("New listing found: %s", listing.url)
+            elif debug:
+                logger.debug("Skipping duplicate listing: %s", listing.url)
         
-        self.save_listings(current_listings)
+        logger.debug("Found %s new listings out of %s current listings", len(new_listings), len(current_listings))
         return new_listings
+
+    def _fetch_current_listings(self, target_url: str) -> Optional[List[ProductListing]]:
+        """Fetches and extracts the current listings, or returns None if the page hasn't changed."""
+        try:
+            scraped_region = self.scrape_site(target_url=target_url, region_xpaths=self.PRODUCT_REGION_XPATHS)
+        except NotModified:
+            logger.info("Listings page not modified since last scrape")
+            return None
+        
+        # Servers without ETag support still let us skip extraction when the
+        # trimmed product region is byte-for-byte what we processed last time.
+        # The card XPaths are relative to this same element, so the hash covers
+        # everything extraction reads and a changed card can't hide behind it.
+        self._pending_validators['html_hash'] = _content_hash(self.serialize_html(scraped_region))
+        if self._pending_validators['html_hash'] == self.validators.get(target_url, {}).get('html_hash'):
+            logger.info("Listings page content unchanged since last scrape")
+            self.save_validators(target_url, self._pending_validators)
+            return None
+        
+        return self.get_current_listings(html_content=scraped_region, site=urlsplit(target_url).netloc)
     
     def load_previous_listings(self) -> List[ProductListing]:
-        """Loads previous listings from JSON file."""
+        """Loads previous listings from the snapshot plus any patches logged since."""
+        data, _, _ = self._load_listing_state()
+        return [ProductListing(**item) for item in data]
+    
+    def load_previous_paths(self) -> FrozenSet[str]:
+        """Loads the product paths of the previous listings, for membership checks."""
+        data, _, _ = self._load_listing_state()
+        return frozenset(_product_path(item['url']) for item in data)
+    
+    def save_listings(self, listings: List[ProductListing], previous_state: Optional[Tuple[List[dict], int, int]] = None):
+        """
+        Saves current listings as a JSON Patch against the previous state.
+        
+        Each change is appended to LISTINGS_LOG_FILE as {seq, ts, patch}; nothing
+        is written when the listings are unchanged. The full snapshot in DATA_FILE
+        is written when none exists yet and then every SNAPSHOT_INTERVAL patches,
+        which also resets the log. The snapshot records the seq of the last change
+        it includes, so if the log can't be reset after a snapshot, replay skips
+        the entries already folded into it.
+        
+        Args:
+            listings: Current listings to save
+            previous_state: The state from _load_listing_state, if the caller
+                already has it; otherwise it is loaded here
+        """
+        current = [asdict(listing) for listing in listings]
+        previous, patch_count, seq = previous_state or self._load_listing_state()
+        patch = jsonpatch.make_patch(previous, current)
+        if not patch.patch:
+            logger.debug("Listings unchanged, nothing to save")
+            return
+        
+        seq += 1
+        if patch_count + 1 >= self.config.SNAPSHOT_INTERVAL:
+            snapshot = _json_dumps({'seq': seq, 'listings': current})
+            _write_atomic(self.config.DATA_FILE, zstd.ZstdCompressor(level=3).compress(snapshot))
+            open(self.config.LISTINGS_LOG_FILE, 'wb').close()
+            return
+        
+        entry = {'seq': seq, 'ts': datetime.now(timezone.utc).isoformat(), 'patch': patch.patch}
+        with open(self.config.LISTINGS_LOG_FILE, 'ab') as f:
+            f.write(_json_dumps(entry) + b'\n')
+
+    def _load_listing_state(self) -> Tuple[List[dict], int, int]:
+        """
+        Replays the patch log on top of the last snapshot.
+        
+        Log entries whose seq the snapshot already includes are skipped.
+        
+        Returns:
+            Tuple[List[dict], int, int]: Current listing data, the number of patches
+            applied and the seq of the last change. If there is no snapshot yet,
+            or the log can't be fully replayed (the state up to the bad entry is
+            returned), the patch count forces a fresh snapshot.
+        """
+        data, snapshot_seq = self._load_snapshot()
+        seq = snapshot_seq or 0
+        patch_count = 0
+        try:
+            with open(self.config.LISTINGS_LOG_FILE, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = _json_loads(line)
+                    if entry['seq'] <= seq:
+                        continue
+                    data = jsonpatch.apply_patch(data, entry['patch'])
+                    seq = entry['seq']
+                    patch_count += 1
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, KeyError, TypeError, jsonpatch.JsonPatchException, jsonpatch.JsonPointerException) as e:
+            logger.warning("Failed to replay listings log after %s patches: %s", patch_count, e)
+            return data, self.config.SNAPSHOT_INTERVAL, seq
+        
+        if snapshot_seq is None:
+            return data, self.config.SNAPSHOT_INTERVAL, seq
+        return data, patch_count, seq
+
+    def _load_snapshot(self) -> Tuple[List[dict], Optional[int]]:
+        """
+        Loads the zstd-compressed listings snapshot and the seq it includes.
+        
+        Falls back to the legacy plain JSON file; the seq is None whenever no
+        usable snapshot exists.
+        """
+        try:
+            with open(self.config.DATA_FILE, 'rb') as f:
+                compressed = f.read()
+            # The Docker image ships an empty placeholder until the first snapshot
+            if compressed:
+                snapshot = _json_loads(zstd.ZstdDecompressor().decompress(compressed))
+                return snapshot['listings'], snapshot['seq']
+        except FileNotFoundError:
+            pass
+        except (zstd.ZstdError, json.JSONDecodeError, KeyError, TypeError):
+            return [], None
+        
         try:
-            with open(self.config.DATA_FILE, 'r') as f:
-                data = json.load(f)
-                return [ProductListing(**item) for item in data]
+            with open(self.config.LEGACY_DATA_FILE, 'rb') as f:
+                return _json_loads(f.read()), None
         except (FileNotFoundError, json.JSONDecodeError):
-            return []
+            return [], None
+
+    def load_validators(self) -> dict:
+        """Loads the cached ETag / Last-Modified validators and content hash, keyed by URL, from JSON file."""
+        try:
+            with open(self.config.CACHE_FILE, 'rb') as f:
+                return _json_loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def save_validators(self, target_url: str, validators: dict):
+        """Saves the ETag / Last-Modified validators and content hash for target_url to JSON file."""
+        self.validators[target_url] = validators
+        _write_atomic(self.config.CACHE_FILE, _json_dumps(self.validators))
+    
+    def load_site_profiles(self) -> dict:
+        """Loads the stored card selector per site, keyed by domain, from JSON file."""
+        try:
+            with open(self.config.PROFILES_FILE, 'rb') as f:
+                return _json_loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
     
-    def save_listings(self, listings: List[ProductListing]):
-        """Saves current listings to JSON file."""
-        with open(self.config.DATA_FILE, 'w') as f:
-            json.dump([vars(listing) for listing in listings], f)
+    def save_site_profile(self, site: str, profile: dict):
+        """Stores the winning selectors for site and rewrites the profiles file."""
+        self.site_profiles[site] = profile
+        os.makedirs(os.path.dirname(self.config.PROFILES_FILE), exist_ok=True)
+        _write_atomic(self.config.PROFILES_FILE, _json_dumps(self.site_profiles))
@@ -0,0 +1,208 @@
+import os
+import tempfile
+import threading
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+
+from config import Config
+from scraper import WebScraper, _parse_price
+
+
+def _card(i: int) -> str:
+    return (f'<li class="product"><a href="/product/item-{i}/"><img src="/img/{i}.png">'
+            f'<h2>Item {i}</h2></a><span class="price">${i},000.00</span></li>')
+
+
+def _page(card_ids) -> str:
+    # The header nav shares class names with product grids but holds no listings
+    return ('<html><body><header><nav class="grid grid-cols-3"><a href="/"><img src="/logo.png"></a>'
+            '<a class="nav-products" href="/shop">Shop</a></nav></header>'
+            '<main><ul class="products">' + ''.join(_card(i) for i in card_ids) + '</ul>'
+            '<ul class="related">' + _card(999) + '</ul></main></body></html>')
+
+
+class ScraperTestCase(unittest.TestCase):
+    """Runs the scraper against an in-memory site from a scratch working directory."""
+
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {'DISCORD_CHANNEL_ID': '1', 'LLM_FALLBACK': 'false'})
+        env.start()
+        self.addCleanup(env.stop)
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(workdir.name)
+        self.addCleanup(os.chdir, cwd)
+
+        self.html = ''
+        self.scraper = WebScraper(Config())
+        self.scraper.client.close()
+        self.scraper.client = httpx.Client(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, html=self.html))
+        )
+        self.addCleanup(self.scraper.close)
+
+    def poll(self, card_ids):
+        self.html = _page(card_ids)
+        return self.scraper.get_new_listings()
+
+
+class ChangeDetectionTest(ScraperTestCase):
+
+    def test_unchanged_page_is_skipped(self):
+        self.assertEqual(len(self.poll(range(25))), 25)
+        with mock.patch.object(self.scraper, 'get_current_listings') as extract:
+            self.assertEqual(self.poll(range(25)), [])
+        extract.assert_not_called()
+
+    def test_changed_card_set_is_not_skipped(self):
+        self.poll(range(25))
+        new_listings = self.poll(range(30))
+        self.assertEqual(sorted(listing.name for listing in new_listings),
+                         [f"Item {i}" for i in range(25, 30)])
+
+    def test_poll_loads_state_once_and_saves_off_the_event_loop(self):
+        self.poll(range(25))
+        save_threads = []
+        save_listings = self.scraper.save_listings
+
+        def record_thread(*args):
+            save_threads.append(threading.current_thread())
+            return save_listings(*args)
+
+        with mock.patch.object(self.scraper, '_load_listing_state', wraps=self.scraper._load_listing_state) as load, \
+                mock.patch.object(self.scraper, 'save_listings', side_effect=record_thread):
+            self.assertEqual(len(self.poll(range(26))), 1)
+        self.assertEqual(load.call_count, 1)
+        self.assertNotIn(threading.main_thread(), save_threads)
+
+    def test_short_selector_result_is_not_saved(self):
+        self.poll(range(25))
+        with self.assertRaises(ValueError):
+            self.poll(range(2))
+        self.assertEqual(len(self.scraper.load_previous_paths()), 25)
+        self.assertEqual(self.poll(range(25)), [])
+
+    def test_cards_outside_the_region_are_ignored(self):
+        listings = self.poll(range(25))
+        self.assertNotIn("Item 999", {listing.name for listing in listings})
+
+
+class ListingPersistenceTest(ScraperTestCase):
+
+    def listings(self, card_ids):
+        return self.scraper.get_current_listings(_page(card_ids))
+
+    def test_first_save_writes_a_snapshot(self):
+        self.scraper.save_listings(self.listings(range(25)))
+        self.assertTrue(os.path.getsize(self.scraper.config.DATA_FILE))
+        self.assertFalse(os.path.exists(self.scraper.config.LISTINGS_LOG_FILE)
+                         and os.path.getsize(self.scraper.config.LISTINGS_LOG_FILE))
+
+    def test_log_left_behind_by_a_snapshot_is_not_replayed(self):
+        self.scraper.config.SNAPSHOT_INTERVAL = 3
+        for n in range(21, 24):
+            self.scraper.save_listings(self.listings(range(n)))
+        with open(self.scraper.config.LISTINGS_LOG_FILE, 'rb') as f:
+            stale_log = f.read()
+        self.scraper.save_listings(self.listings(range(24)))
+        # Simulate a crash after the snapshot was swapped in but before the log was reset
+        with open(self.scraper.config.LISTINGS_LOG_FILE, 'wb') as f:
+            f.write(stale_log)
+        self.assertEqual(self.scraper.load_previous_listings(), self.listings(range(24)))
+        self.scraper.save_listings(self.listings(range(20)))
+        self.assertEqual(self.scraper.load_previous_listings(), self.listings(range(20)))
+
+
+class ListingValidationTest(ScraperTestCase):
+
+    def test_links_without_an_http_scheme_are_rejected(self):
+        for url in ('', 'javascript:void(0)', 'ftp://example.com/item'):
+            item = {'name': 'Item', 'price': '$10', 'url': url, 'image_url': '/img/1.png'}
+            self.assertIsNone(self.scraper._listing_from_item(item), url)
+
+    def test_relative_links_are_made_absolute(self):
+        item = {'name': 'Item', 'price': '$10', 'url': '/product/item-1/', 'image_url': '//cdn.example.com/1.png'}
+        listing = self.scraper._listing_from_item(item)
+        self.assertEqual(listing.url, 'https://kfamarketplace.com/product/item-1/')
+        self.assertEqual(listing.image_url, 'https://cdn.example.com/1.png')
+
+
+class FakeOpenAI:
+    """Answers each extraction call with the next listing count in counts."""
+
+    def __init__(self, *counts):
+        self.counts = list(counts)
+        self.models = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        self.models.append(model)
+        items = [{'name': f"Item {i}", 'price': f"${i}.00", 'url': f"/product/item-{i}/", 'image_url': f"/img/{i}.png"}
+                 for i in range(self.counts.pop(0))]
+        tool_call = SimpleNamespace(function=SimpleNamespace(arguments=json.dumps({'listings': items})))
+        return SimpleNamespace(choices=[SimpleNamespace(finish_reason='tool_calls',
+                                                        message=SimpleNamespace(tool_calls=[tool_call]))])
+
+
+class LLMExtractionTest(ScraperTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.scraper.config.LLM_FALLBACK = True
+
+    def cached_extractions(self):
+        cache_dir = self.scraper.config.LISTINGS_CACHE_DIR
+        return os.listdir(cache_dir) if os.path.isdir(cache_dir) else []
+
+    def test_complete_extraction_is_cached(self):
+        self.scraper.openai = FakeOpenAI(25)
+        self.assertEqual(len(self.scraper._extract_with_llm('<p>page</p>')), 25)
+        self.assertEqual(len(self.scraper._extract_with_llm('<p>page</p>')), 25)
+        self.assertEqual(len(self.scraper.openai.models), 1)
+
+    def test_short_extraction_is_escalated_then_rejected(self):
+        self.scraper.openai = FakeOpenAI(3, 3)
+        with self.assertRaises(ValueError):
+            self.scraper._extract_with_llm('<p>page</p>')
+        self.assertEqual(self.scraper.openai.models, [self.scraper.config.SCRAPER_MODEL, WebScraper.ESCALATION_MODEL])
+        self.assertEqual(self.cached_extractions(), [])
+
+    def test_empty_extraction_leaves_saved_state_alone(self):
+        self.assertEqual(len(self.poll(range(25))), 25)
+        self.scraper.openai = FakeOpenAI(0, 0)
+        with self.assertRaises(ValueError):
+            self.poll(range(2))
+        self.assertEqual(len(self.scraper.load_previous_paths()), 25)
+        self.assertEqual(self.cached_extractions(), [])
+        # The failed page's hash isn't recorded, so it is extracted again next time
+        self.scraper.openai = FakeOpenAI(0, 0)
+        with self.assertRaises(ValueError):
+            self.poll(range(2))
+        self.assertEqual(self.poll(range(25)), [])
+
+    def test_cache_is_pruned(self):
+        self.scraper.config.LISTINGS_CACHE_MAX_ENTRIES = 2
+        self.scraper.openai = FakeOpenAI(25, 25, 25)
+        for page in range(3):
+            self.scraper._extract_with_llm(f"<p>page {page}</p>")
+        self.assertEqual(len(self.cached_extractions()), 2)
+
+
+class PriceParsingTest(unittest.TestCase):
+
+    def test_first_dollar_amount_wins(self):
+        self.assertEqual(_parse_price("$1,234.50"), 1234.5)
+        self.assertEqual(_parse_price("$10 - $20"), 10.0)
+
+    def test_text_without_a_price_is_rejected(self):
+        self.assertIsNone(_parse_price("Sold out"))
+        self.assertIsNone(_parse_price(""))
+
+
+if __name__ == '__main__':
+    unittest.main()